@@ -44,6 +44,8 @@ def kernelcache_process(untag_pointers=True):
     import idc
     def autoanalyze():
         idc.Wait()
+    # The segments may have changed since any previous run in this IDA session.
+    ida_utilities.invalidate_segment_cache()
     autoanalyze()
     if (kernel.kernelcache_format == kernel.KC_12_MERGED
             and untag_pointers
@@ -87,7 +87,7 @@ def _emulate_arm64(start, end, on_BL=None, on_RET=None):
     def cleartemps():
         for t in ['X{}'.format(i) for i in range(0, 19)]:
             reg.clear(t)
-    for insn in idau.Instructions(start, end):
+    for insn in idau.Instructions(start, end, reuse=True):
         _log(11, 'Processing instruction {:#x}', insn.ea)
         mnem = insn.get_canon_mnem()
         if mnem == 'ADRP' or mnem == 'ADR':
@@ -15,6 +15,7 @@ this module does not take that approach, for reasons of simplicity and efficienc
 
 """
 
+import bisect
 import collections
 
 import idc
@@ -25,14 +26,14 @@ import ida_utilities as idau
 
 _log = idau.make_log(2, __name__)
 
-_INSN_OP_CHG = [
+_INSN_OP_CHG = (
     idaapi.CF_CHG1,
     idaapi.CF_CHG2,
     idaapi.CF_CHG3,
     idaapi.CF_CHG4,
     idaapi.CF_CHG5,
     idaapi.CF_CHG6,
-]
+)
 
 _INSN_OP_DTYP_SZ = {
     idaapi.dt_byte:  1,
@@ -41,8 +42,57 @@ _INSN_OP_DTYP_SZ = {
     idaapi.dt_qword: 8,
 }
 
+_DTYP_SZ = tuple(_INSN_OP_DTYP_SZ.get(dtyp, 0) for dtyp in xrange(16))
+"""_INSN_OP_DTYP_SZ as a tuple indexed by dtyp, with 0 for unsupported dtyps."""
+
+_SIZE_LOG2 = { 1: 0, 2: 1, 4: 2, 8: 3 }
+"""The base-2 logarithm of each access size, used to pack an (offset, size) pair into one int."""
+
 _ARM64_WRITEBACK = 0x20 | 0x80
 
+# The kinds of instructions recognized by _pointer_accesses_process_block.
+_INSN_OTHER   = 0
+_INSN_MOV_REG = 1
+_INSN_MOV_IMM = 2
+_INSN_ADD_IMM = 3
+_INSN_CALL    = 4
+
+_ARM64_TEMP_REGS = None
+"""The register numbers of the Arm64 temporary registers X0-X18. Use _arm64_temp_regs()."""
+
+_REG_FILE_SIZE = None
+"""The number of entries in a register file. Use _new_reg_file()."""
+
+_canon_feature_cache = {}
+"""A cache of insn.get_canon_feature() for each instruction type, which is static per itype."""
+
+_Operand = collections.namedtuple('_Operand',
+        ['n', 'type', 'dtyp', 'reg', 'addr', 'value', 'specflag1'])
+
+def _arm64_temp_regs():
+    """Get the register numbers of the Arm64 temporary registers X0-X18."""
+    # idautils.procregs is only meaningful once a database is loaded, so look these up lazily.
+    global _ARM64_TEMP_REGS
+    if _ARM64_TEMP_REGS is None:
+        _ARM64_TEMP_REGS = tuple(getattr(idautils.procregs, 'X{}'.format(r)).reg
+                for r in xrange(0, 19))
+    return _ARM64_TEMP_REGS
+
+def _new_reg_file():
+    """Create an empty register file.
+
+    A register file is a list indexed by register number, with None for registers that have no
+    known value. Indexing and copying a list is much cheaper than the equivalent dict operations.
+    """
+    global _REG_FILE_SIZE
+    if _REG_FILE_SIZE is None:
+        _REG_FILE_SIZE = max(256, len(idaapi.ph_get_regnames()))
+    return [None] * _REG_FILE_SIZE
+
+def _reg_file_dict(reg_file):
+    """Convert a register file into a dict of the registers that have a value, for logging."""
+    return { reg: value for reg, value in enumerate(reg_file) if value is not None }
+
 def _create_flow(function, bounds):
     """Create a FlowChart."""
     f, b = None, None
@@ -55,145 +105,302 @@ def _create_flow(function, bounds):
         b = (start, end)
     return idaapi.FlowChart(f=f, bounds=b)
 
-def _add_blocks_to_queue(queue, flow, addresses):
+def _blocks_containing(blocks, addresses):
+    """Find the basic blocks in the given list that contain the given addresses."""
+    # Sort the blocks by start address so that we can find the block containing an address by
+    # bisection.
+    bounds = sorted((bb.startEA, bb.endEA, bb.id) for bb in blocks)
+    starts = [start for start, _, _ in bounds]
+    blocks_by_id = { bb.id: bb for bb in blocks }
+    containing = []
     for ea in addresses:
-        for bb in flow:
-            if bb.startEA <= ea < bb.endEA:
-                queue.append(bb)
-                break
+        index = bisect.bisect_right(starts, ea) - 1
+        if index >= 0 and ea < bounds[index][1]:
+            containing.append(blocks_by_id[bounds[index][2]])
         else:
             _log(2, 'Address {:#x} not contained in any basic block', ea)
+    return containing
+
+def _reverse_postorder(roots, succs_map):
+    """Get the basic blocks reachable from the given blocks in reverse postorder.
+
+    succs_map maps each block id to the list of the block's successors.
+    """
+    visited = set()
+    postorder = []
+    for root in roots:
+        if root.id in visited:
+            continue
+        visited.add(root.id)
+        # Iterative depth-first search, since functions can have more blocks than Python's recursion
+        # limit.
+        stack = [(root, iter(succs_map[root.id]))]
+        while stack:
+            bb, succs = stack[-1]
+            for succ in succs:
+                if succ.id not in visited:
+                    visited.add(succ.id)
+                    stack.append((succ, iter(succs_map[succ.id])))
+                    break
+            else:
+                stack.pop()
+                postorder.append(bb)
+    postorder.reverse()
+    return postorder
+
+def _insn_operands(insn):
+    """Read the operands of an instruction for _pointer_accesses_decode_block.
+
+    Every attribute access on an IDAPython op_t crosses into IDA, so we read each field we need
+    exactly once and return a list of _Operand tuples, one for each operand up to the first o_void.
+    """
+    ops = []
+    for op in insn.Operands:
+        type = op.type
+        if type == idaapi.o_void:
+            break
+        ops.append(_Operand(op.n, type, op.dtyp, op.reg, op.addr, op.value, op.specflag1))
+    return ops
 
-def _pointer_accesses_process_block(start, end, fix, entry_regs, accesses):
+def _pointer_accesses_decode_insn(insn, feature):
+    """Decode an instruction into a record for _pointer_accesses_process_block.
+
+    All the checks that depend only on the instruction (and not on the register state) are done
+    here, so that processing a block is just a dispatch on the instruction kind. See
+    _pointer_accesses_decode_block for the record format.
+    """
+    # Look up the IDA constants once; each idaapi.X is an attribute lookup.
+    o_reg, o_imm, o_displ, o_phrase = idaapi.o_reg, idaapi.o_imm, idaapi.o_displ, idaapi.o_phrase
+    dt_dword, dt_qword = idaapi.dt_dword, idaapi.dt_qword
+    itype   = insn.itype
+    auxpref = insn.auxpref
+    ops     = _insn_operands(insn)
+    nops    = len(ops)
+    # Collect the memory operands that could access the memory region. See comment about auxpref
+    # below.
+    mem_ops = []
+    if not (auxpref & _ARM64_WRITEBACK):
+        for op in ops:
+            # We only consider o_displ and o_phrase.
+            if op.type not in (o_displ, o_phrase):
+                continue
+            # Get the instruction access size.
+            size = _DTYP_SZ[op.dtyp] if op.dtyp < len(_DTYP_SZ) else 0
+            if not size:
+                continue
+            size_log2 = _SIZE_LOG2[size]
+            # The offset from the base register is either a displacement or the value of an index
+            # register.
+            if op.type == o_displ:
+                mem_ops.append((op.reg, size_log2, op.addr, None))
+            else: # op.type == o_phrase
+                mem_ops.append((op.reg, size_log2, None, op.specflag1 & 0xff))
+    # On Arm64, LDR-type instructions store their writeback behavior in the instructions's auxpref
+    # flags. As best I can tell, insn.get_canon_feature()'s CF_CHG* flags indicate whether the
+    # operand will change, which is different than the register changing for operands like o_displ
+    # that use a register to refer to a memory location. Thus, we actually need to special case
+    # auxpref and clear those registers. Fortunately, writeback behavior is only observed in
+    # o_displ operands, of which there should only ever be one, so it doesn't matter that auxpref
+    # is stored on the instruction and not the operand.
+    clobbers = tuple(op.reg for op in ops
+            if ((feature & _INSN_OP_CHG[op.n] and op.type == o_reg)
+                or (auxpref & _ARM64_WRITEBACK and op.type == o_displ)))
+    # Classify the instruction.
+    kind, args = _INSN_OTHER, ()
+    if (itype == idaapi.ARM_mov
+            and nops == 2
+            and ops[0].type == o_reg
+            and ops[1].type == o_reg
+            and ops[0].dtyp == dt_qword
+            and ops[1].dtyp == dt_qword):
+        # MOV Xdst, Xsrc
+        kind, args = _INSN_MOV_REG, (ops[0].reg, ops[1].reg)
+    elif (itype == idaapi.ARM_mov
+            and nops == 2
+            and ops[0].type == o_reg
+            and ops[1].type == o_imm
+            and ops[0].dtyp in (dt_dword, dt_qword)):
+        # MOV Xdst, #imm
+        kind, args = _INSN_MOV_IMM, (ops[0].reg, ops[1].value)
+    elif (itype == idaapi.ARM_add
+            and nops == 3
+            and ops[0].type == o_reg
+            and ops[1].type == o_reg
+            and ops[2].type == o_imm
+            and ops[0].dtyp == dt_qword
+            and ops[1].dtyp == dt_qword):
+        # ADD Xdst, Xsrc, #amt
+        kind, args = _INSN_ADD_IMM, (ops[0].reg, ops[1].reg, ops[2].value)
+    elif (itype == idaapi.ARM_bl or itype == idaapi.ARM_blr):
+        # BL/BLR
+        kind = _INSN_CALL
+    return (insn.ea, kind, tuple(mem_ops), args, clobbers)
+
+def _pointer_accesses_decode_block(start, end):
+    """Decode the instructions of a basic block for _pointer_accesses_process_block.
+
+    Returns a list of (ea, kind, mem_ops, args, clobbers) records, one for each instruction:
+        ea: The address of the instruction.
+        kind: One of the _INSN_* constants.
+        mem_ops: A tuple of (base_reg, size_log2, displacement, index_reg) tuples, one for each
+            memory operand that could access the memory region, where size_log2 is the base-2
+            logarithm of the access size. Exactly one of displacement and index_reg is None.
+        args: The operands for the instruction kind: (dst, src) for _INSN_MOV_REG, (dst, imm) for
+            _INSN_MOV_IMM, (dst, src, imm) for _INSN_ADD_IMM, and () otherwise.
+        clobbers: The registers modified by the instruction if it is treated as unrecognized.
+
+    The data flow may visit a block many times, but the instructions never change, so each block is
+    decoded only once.
+    """
+    insns = []
+    # Decode every instruction into the same insn rather than using idau.Instructions(), which
+    # allocates a new instruction each time. This is safe because we don't keep the insn around.
+    insn = idau.insn_create()
+    ea = start
+    while ea < end:
+        size = idau.insn_decode(insn, ea)
+        if size == 0:
+            break
+        if ea + size > end:
+            raise idau.AlignmentError(end)
+        itype = insn.itype
+        feature = _canon_feature_cache.get(itype)
+        if feature is None:
+            feature = insn.get_canon_feature()
+            _canon_feature_cache[itype] = feature
+        insns.append(_pointer_accesses_decode_insn(insn, feature))
+        ea += size
+    return insns
+
+def _pointer_accesses_process_block(insns, fix, entry_regs, entry_live, raw_accesses):
     """Process a basic block for _pointer_accesses_data_flow.
 
+    The block's instructions are supplied as decoded by _pointer_accesses_decode_block. The
+    registers pointing into the memory region on entry are given as a register file (see
+    _new_reg_file) along with the list of registers in it that are not None. Returns a tuple
+    (exit_regs, live), where exit_regs is a new register file for the registers on exit and live is
+    a set containing every register that might not be None in exit_regs. Each access is
+    appended to raw_accesses as a (key, address, delta) tuple, where key packs the access offset and
+    size as (offset << 4) | log2(size).
+
     Arm64 only."""
     # NOTE: Some object accesses (to large offsets) are encoded in the following style:
     #   MOV             W8, #0x9210
     #   STR             X0, [X19,X8]
     # We try to catch these by keeping track of local constants within a block.
-    RegValue = collections.namedtuple('RegValue', ['type', 'value'])
-    DELTA = 0   # Pointer delta from start of target memory region.
-    CONST = 1   # Constant value
-    def get_reg(reg, type):
-        rv = regs.get(reg, None)
-        if rv is None or rv.type != type:
-            return None
-        return rv.value
-
-    # Initialize our registers and create accessor functions.
-    regs = { reg: RegValue(DELTA, delta) for reg, delta in entry_regs.items() }
+    #
+    # Each register is either a pointer delta from the start of the target memory region (deltas),
+    # a constant value (consts), or unknown. At most one of deltas[reg] and consts[reg] is not
+    # None.
+    deltas = list(entry_regs)
+    consts = [None] * len(deltas)
+    # live is every register that has been given a delta, so that the caller doesn't need to scan
+    # the whole register file.
+    live = set(entry_live)
+    add_live = live.add
+    temp_regs = _arm64_temp_regs()
+    # Bind the globals used in the loop to locals, which are faster to access.
+    log = _log
+    MOV_REG, MOV_IMM, ADD_IMM, CALL = _INSN_MOV_REG, _INSN_MOV_IMM, _INSN_ADD_IMM, _INSN_CALL
+    append_access = raw_accesses.append
 
     # For each instruction in the basic block, see if any new register gets assigned.
-    for insn in idau.Instructions(start, end):
+    for ea, kind, mem_ops, args, clobbers in insns:
         # First, if this instruction has a fixed state (i.e., a set mapping of registers to
         # deltas), set that state. This overwrites any previous values, so care must be taken by
         # the caller to ensure that this initialization is correct.
-        fixed_regs_and_deltas = fix.get(insn.ea)
+        fixed_regs_and_deltas = fix.get(ea)
         if fixed_regs_and_deltas:
             for reg, delta in fixed_regs_and_deltas.items():
-                _log(6, '\t\t{:x}  fix {}={}', insn.ea, reg, delta)
-                regs[reg] = RegValue(DELTA, delta)
-        # If this is an access instruction, record the access. See comment about auxpref below.
-        if not (insn.auxpref & _ARM64_WRITEBACK):
-            for op in insn.Operands:
-                # We only consider o_displ and o_phrase.
-                if op.type == idaapi.o_void:
-                    break
-                elif op.type not in (idaapi.o_displ, idaapi.o_phrase):
-                    continue
-                # Get the delta for the base register.
-                delta = get_reg(op.reg, DELTA)
-                if delta is None:
-                    continue
-                # Get the instruction access size.
-                size = _INSN_OP_DTYP_SZ.get(op.dtyp)
-                if size is None:
-                    continue
-                # Get the offset from the base register (which is additional to the base register's
-                # delta).
-                op_offset = None
-                if op.type == idaapi.o_displ:
-                    op_offset = op.addr
-                else: # op.type == idaapi.o_phrase
-                    op_offset_reg = op.specflag1 & 0xff
-                    op_offset = get_reg(op_offset_reg, CONST)
+                log(6, '\t\t{:x}  fix {}={}', ea, reg, delta)
+                deltas[reg] = delta
+                consts[reg] = None
+                add_live(reg)
+        # If this is an access instruction, record the access.
+        for reg, size_log2, op_offset, op_offset_reg in mem_ops:
+            # Get the delta for the base register.
+            delta = deltas[reg]
+            if delta is None:
+                continue
+            # Get the offset from the base register (which is additional to the base register's
+            # delta).
+            if op_offset_reg is not None:
+                op_offset = consts[op_offset_reg]
                 if op_offset is None:
                     continue
-                # Record this access.
-                offset = (delta + op_offset) & 0xffffffffffffffff
-                _log(5, '\t\t{:x}  access({})  {}, {}', insn.ea, op.reg, offset, size)
-                accesses[(offset, size)].add((insn.ea, delta))
+            # Record this access.
+            offset = (delta + op_offset) & 0xffffffffffffffff
+            log(5, '\t\t{:x}  access({})  {}, {}', ea, reg, offset, 1 << size_log2)
+            append_access(((offset << 4) | size_log2, ea, delta))
         # Update the set of registers pointing to the struct, and the set of known constant
         # registers.
-        if (insn.itype == idaapi.ARM_mov
-                and insn.Op1.type == idaapi.o_reg
-                and insn.Op2.type == idaapi.o_reg
-                and insn.Op3.type == idaapi.o_void
-                and insn.Op1.dtyp == idaapi.dt_qword
-                and insn.Op2.dtyp == idaapi.dt_qword
-                and insn.Op2.reg in regs):
+        if (kind == MOV_REG
+                and (deltas[args[1]] is not None or consts[args[1]] is not None)):
             # MOV Xdst, Xsrc
-            _log(6, '\t\t{:x}  add {}={}', insn.ea, insn.Op1.reg, regs[insn.Op2.reg].value)
-            regs[insn.Op1.reg] = regs[insn.Op2.reg]
-        elif (insn.itype == idaapi.ARM_mov
-                and insn.Op1.type == idaapi.o_reg
-                and insn.Op2.type == idaapi.o_imm
-                and insn.Op3.type == idaapi.o_void
-                and insn.Op1.dtyp in (idaapi.dt_dword, idaapi.dt_qword)):
+            dst, src = args
+            log(6, '\t\t{:x}  add {}={}', ea, dst,
+                    deltas[src] if deltas[src] is not None else consts[src])
+            deltas[dst] = deltas[src]
+            consts[dst] = consts[src]
+            add_live(dst)
+        elif kind == MOV_IMM:
             # MOV Xdst, #imm
-            _log(7, '\t\t{:x}  const {}={}', insn.ea, insn.Op1.reg, insn.Op2.value)
-            regs[insn.Op1.reg] = RegValue(CONST, insn.Op2.value)
-        elif (insn.itype == idaapi.ARM_add
-                and insn.Op1.type == idaapi.o_reg
-                and insn.Op2.type == idaapi.o_reg
-                and insn.Op3.type == idaapi.o_imm
-                and insn.Op4.type == idaapi.o_void
-                and insn.Op1.dtyp == idaapi.dt_qword
-                and insn.Op2.dtyp == idaapi.dt_qword
-                and insn.Op2.reg in regs):
+            dst, imm = args
+            log(7, '\t\t{:x}  const {}={}', ea, dst, imm)
+            deltas[dst] = None
+            consts[dst] = imm
+        elif (kind == ADD_IMM
+                and (deltas[args[1]] is not None or consts[args[1]] is not None)):
             # ADD Xdst, Xsrc, #amt
-            op2 = regs[insn.Op2.reg]
-            _log(6, '\t\t{:x}  add {}={}+{}', insn.ea, insn.Op1.reg, op2.value, insn.Op3.value)
-            regs[insn.Op1.reg] = RegValue(op2.type, op2.value + insn.Op3.value)
-        elif (insn.itype == idaapi.ARM_bl or insn.itype == idaapi.ARM_blr):
+            dst, src, amt = args
+            if deltas[src] is not None:
+                log(6, '\t\t{:x}  add {}={}+{}', ea, dst, deltas[src], amt)
+                deltas[dst] = deltas[src] + amt
+                consts[dst] = None
+                add_live(dst)
+            else:
+                log(6, '\t\t{:x}  add {}={}+{}', ea, dst, consts[src], amt)
+                consts[dst] = consts[src] + amt
+                deltas[dst] = None
+        elif kind == CALL:
             # A function call (direct or indirect). Any correct compiler should generate code that
             # does not use the temporary registers after a call, but just to be safe, clear all the
             # temporary registers.
-            _log(6, '\t\t{:x}  clear temps', insn.ea)
-            for r in xrange(0, 19):
-                regs.pop(getattr(idautils.procregs, 'X{}'.format(r)).reg, None)
+            log(6, '\t\t{:x}  clear temps', ea)
+            for r in temp_regs:
+                deltas[r] = None
+                consts[r] = None
         else:
             # This is an unrecognized instruction. Clear all the registers it modifies.
-            feature = insn.get_canon_feature()
-            # On Arm64, LDR-type instructions store their writeback behavior in the instructions's
-            # auxpref flags. As best I can tell, insn.get_canon_feature()'s CF_CHG* flags indicate
-            # whether the operand will change, which is different than the register changing for
-            # operands like o_displ that use a register to refer to a memory location. Thus, we
-            # actually need to special case auxpref and clear those registers. Fortunately,
-            # writeback behavior is only observed in o_displ operands, of which there should only
-            # ever be one, so it doesn't matter that auxpref is stored on the instruction and not
-            # the operand.
-            for op in insn.Operands:
-                if op.type == idaapi.o_void:
-                    break
-                if ((feature & _INSN_OP_CHG[op.n] and op.type == idaapi.o_reg)
-                        or (insn.auxpref & _ARM64_WRITEBACK and op.type == idaapi.o_displ)):
-                    _log(6, '\t\t{:x}  clear {}', insn.ea, op.reg)
-                    regs.pop(op.reg, None)
-    return { reg: rv.value for reg, rv in regs.items() if rv.type == DELTA }
+            for reg in clobbers:
+                log(6, '\t\t{:x}  clear {}', ea, reg)
+                deltas[reg] = None
+                consts[reg] = None
+    return deltas, live
 
-def _pointer_accesses_data_flow(flow, initialization, accesses):
+def _pointer_accesses_data_flow(flow, initialization, raw_accesses):
     """Run the data flow for pointer_accesses."""
-    # bb_regs maps each block id to another map from register ids to corresponding struct offsets
-    # at the start of the block. We don't consider the case where a register could contain more
-    # than one possible offset.
-    bb_regs = { bb.id: {} for bb in flow }
-    # We'll start by processing those blocks that have an initial value.
-    queue = collections.deque()
-    _add_blocks_to_queue(queue, flow, initialization)
-    # Process each block, propagating its set of registers to its successors. This isn't quite a
-    # true data flow: We should run it until there are no more changes, then check the accesses
+    # Iterating over a FlowChart or a block's successors creates new BasicBlock objects through IDA
+    # each time, so get the blocks and their successors just once.
+    blocks = list(flow)
+    blocks_by_id = { bb.id: bb for bb in blocks }
+    succs_map = { bb.id: [blocks_by_id[succ.id] for succ in bb.succs()] for bb in blocks }
+    # bb_regs maps each block id to its register file at the start of the block. We don't consider
+    # the case where a register could contain more than one possible offset.
+    bb_regs = { bb.id: _new_reg_file() for bb in blocks }
+    # bb_live maps each block id to the list of registers that are not None in its register file.
+    bb_live = { bb.id: [] for bb in blocks }
+    # We'll start by processing those blocks that have an initial value. Blocks are always processed
+    # in reverse postorder from these blocks, so that a block's predecessors are (loops aside)
+    # processed before it is. dirty is the set of ids of blocks whose entry registers changed since
+    # they were last processed.
+    entry_blocks = _blocks_containing(blocks, initialization)
+    rpo = _reverse_postorder(entry_blocks, succs_map)
+    dirty = set(bb.id for bb in entry_blocks)
+    # block_insns caches the decoded instructions of each block we've visited.
+    block_insns = {}
+    # Process each dirty block, propagating its set of registers to its successors, until no
+    # block's registers change. This isn't quite a true data flow: We should check the accesses
     # conditions only once it's stabilized. The difference occurs when we've processed block A,
     # which had register R with offset O on entry, then later found a block B that jumps back to
     # block A with register R set to a different offset O'. Ideally we should invalidate the
@@ -204,29 +411,48 @@ def _pointer_accesses_data_flow(flow, initialization, accesses):
     # eliminate this possibility and also get better results if we just decline to update register
     # R with offset O' after processing block A, effectively ignoring loops that increment an
     # offset register.
-    while queue:
-        bb = queue.popleft()
-        entry_regs = bb_regs[bb.id]
-        _log(3, 'Basic block {}  {:x}-{:x}', bb.id, bb.startEA, bb.endEA)
-        _log(4, '\tregs@entry = {}', entry_regs)
-        exit_regs = _pointer_accesses_process_block(bb.startEA, bb.endEA, initialization,
-                entry_regs, accesses)
-        _log(4, '\tregs@exit = {}', exit_regs)
-        _log(4, '\tsuccs = {}', [s.id for s in bb.succs()])
-        for succ in bb.succs():
-            # Add the registers at the end of the block to the registers at the start of its
-            # successors' blocks. This is a union since we will track accesses to any register
-            # that can point to the struct along any path. As discussed above, any register that
-            # already had an offset for a successor is ignored.
-            succ_regs = bb_regs[succ.id]
-            update = False
-            for reg in exit_regs:
-                if reg not in succ_regs:
-                    update = True
-                    succ_regs[reg] = exit_regs[reg]
-            # If we added a new register, then we'll process the successor block (again).
-            if update:
-                queue.append(succ)
+    while dirty:
+        for bb in rpo:
+            if bb.id not in dirty:
+                continue
+            dirty.discard(bb.id)
+            entry_regs = bb_regs[bb.id]
+            _log(3, 'Basic block {}  {:x}-{:x}', bb.id, bb.startEA, bb.endEA)
+            if _log(4):
+                _log(4, '\tregs@entry = {}', _reg_file_dict(entry_regs))
+            insns = block_insns.get(bb.id)
+            if insns is None:
+                insns = _pointer_accesses_decode_block(bb.startEA, bb.endEA)
+                block_insns[bb.id] = insns
+            exit_regs, exit_live = _pointer_accesses_process_block(insns, initialization,
+                    entry_regs, bb_live[bb.id], raw_accesses)
+            if _log(4):
+                _log(4, '\tregs@exit = {}', _reg_file_dict(exit_regs))
+            _log(4, '\tsuccs = {}', [s.id for s in succs_map[bb.id]])
+            for succ in succs_map[bb.id]:
+                # Add the registers at the end of the block to the registers at the start of its
+                # successors' blocks. This is a union since we will track accesses to any register
+                # that can point to the struct along any path. As discussed above, any register
+                # that already had an offset for a successor is ignored.
+                succ_regs = bb_regs[succ.id]
+                succ_live = bb_live[succ.id]
+                changed = False
+                for reg in exit_live:
+                    delta = exit_regs[reg]
+                    if delta is not None and succ_regs[reg] is None:
+                        changed = True
+                        succ_regs[reg] = delta
+                        succ_live.append(reg)
+                # If the successor's entry registers changed, then we'll process it (again).
+                if changed:
+                    dirty.add(succ.id)
+
+def _pointer_accesses_collect(raw_accesses, accesses):
+    """Add the raw access records from _pointer_accesses_data_flow to the accesses dictionary."""
+    # Blocks that are processed more than once record the same accesses again, so deduplicate the
+    # records before touching the per-access sets.
+    for key, ea, delta in set(raw_accesses):
+        accesses[(key >> 4, 1 << (key & 0xf))].add((ea, delta))
 
 def pointer_accesses(function=None, bounds=None, initialization=None, accesses=None):
     """Collect the set of accesses to a pointer register.
@@ -270,10 +496,12 @@ def pointer_accesses(function=None, bounds=None, initialization=None, accesses=N
     if flow is None:
         return None
     # Get the set of (offset, size) accesses by running a data flow.
+    raw_accesses = []
+    _pointer_accesses_data_flow(flow, initialization, raw_accesses)
     create = accesses is None
     if create:
         accesses = collections.defaultdict(set)
-    _pointer_accesses_data_flow(flow, initialization, accesses)
+    _pointer_accesses_collect(raw_accesses, accesses)
     if create:
         accesses = dict(accesses)
         return accesses
@@ -5,7 +5,10 @@
 # Some utility functions to make working with IDA easier.
 #
 
+import bisect
 from collections import deque
+from itertools import chain, count, islice, izip
+import struct
 
 import idc
 import idautils
@@ -50,9 +53,18 @@ def _initialize():
 
 _initialize()
 
+# The IDA API functions called for every address or instruction in the iteration helpers below.
+# Binding them to module-level names saves an attribute lookup on the idc and idautils modules per
+# call; the generators additionally take them as default arguments to make them fast locals.
+_isLoaded          = idc.isLoaded
+_bisect_right      = bisect.bisect_right
+_DecodeInstruction = idautils.DecodeInstruction
+
 def iterlen(iterator):
     """Consume an iterator and return its length."""
-    return sum(1 for _ in iterator)
+    # Keep only the last (index, element) pair so that the counting loop runs entirely in C.
+    last = deque(enumerate(iterator, 1), maxlen=1)
+    return last[0][0] if last else 0
 
 class AlignmentError(Exception):
     """An exception that is thrown if an address with improper alignment is encountered."""
@@ -61,6 +73,29 @@ class AlignmentError(Exception):
     def __str__(self):
         return repr(self.address)
 
+_segment_starts = None
+"""The sorted start addresses of the segments in the database, or None if not yet cached."""
+
+_segment_ends = []
+"""The end addresses of the segments in the database, parallel to _segment_starts."""
+
+def _segment_cache_build():
+    """Cache the bounds of every segment so that is_mapped() doesn't need to call into IDA."""
+    global _segment_starts, _segment_ends
+    bounds = sorted((seg, idc.SegEnd(seg)) for seg in idautils.Segments())
+    _segment_starts = [start for start, end in bounds]
+    _segment_ends   = [end for start, end in bounds]
+
+def invalidate_segment_cache():
+    """Discard the cached segment bounds used by is_mapped().
+
+    Call this after adding, removing, or resizing segments. The cache will be rebuilt the next time
+    it is needed.
+    """
+    global _segment_starts, _segment_ends
+    _segment_starts = None
+    _segment_ends   = []
+
 def is_mapped(ea, size=1, value=True):
     """Check if the given address is mapped.
 
@@ -77,14 +112,27 @@ def is_mapped(ea, size=1, value=True):
 
     Notes:
         This function is currently a hack: It only checks the first and last byte.
+
+        If value is False, the check uses a cache of the segment bounds. Call
+        invalidate_segment_cache() after changing the segments in the database.
     """
     if size < 1:
         raise ValueError('Invalid argument: size={}'.format(size))
     # HACK: We only check the first and last byte, not all the bytes in between.
     if value:
-        return idc.isLoaded(ea) and (size == 1 or idc.isLoaded(ea + size - 1))
-    else:
-        return idaapi.getseg(ea) and (size == 1 or idaapi.getseg(ea + size - 1))
+        return _isLoaded(ea) and (size == 1 or _isLoaded(ea + size - 1))
+    # Look the addresses up in the cached segment bounds directly: this is on the hot path of the
+    # offset and tagged pointer scans, so avoid the overhead of any helper calls.
+    if _segment_starts is None:
+        _segment_cache_build()
+    i = _bisect_right(_segment_starts, ea) - 1
+    if i < 0 or ea >= _segment_ends[i]:
+        return False
+    last = ea + size - 1
+    if last < _segment_ends[i]:
+        return True
+    i = _bisect_right(_segment_starts, last) - 1
+    return i >= 0 and last < _segment_ends[i]
 
 def get_name_ea(name, fromaddr=idc.BADADDR):
     """Get the address of a name.
@@ -132,6 +180,12 @@ def get_ea_name(ea, fromaddr=idc.BADADDR, true=False, user=False):
     else:
         return idc.NameEx(fromaddr, ea)
 
+_GetFlags      = idc.GetFlags
+_hasUserName   = idc.hasUserName
+_MakeNameEx    = idc.MakeNameEx
+_SN_CHECK      = idc.SN_CHECK
+_SN_CHECK_AUTO = idc.SN_CHECK | idc.SN_AUTO
+
 def set_ea_name(ea, name, rename=False, auto=False):
     """Set the name of an address.
 
@@ -148,12 +202,11 @@ def set_ea_name(ea, name, rename=False, auto=False):
     Returns:
         True if the address was successfully named (or renamed).
     """
-    if not rename and idc.hasUserName(idc.GetFlags(ea)):
+    # rename is checked first so that renaming never needs to fetch the flags.
+    if not rename and _hasUserName(_GetFlags(ea)):
         return get_ea_name(ea) == name
-    flags = idc.SN_CHECK
-    if auto:
-        flags |= idc.SN_AUTO
-    return bool(idc.MakeNameEx(ea, name, flags))
+    flags = _SN_CHECK_AUTO if auto else _SN_CHECK
+    return bool(_MakeNameEx(ea, name, flags))
 
 def _insn_op_stroff_700(insn, n, sid, delta):
     """A wrapper of idc.OpStroffEx for IDA 7."""
@@ -168,24 +221,81 @@ if idaapi.IDA_SDK_VERSION < 700:
 else:
     insn_op_stroff = _insn_op_stroff_700
 
-def _addresses(start, end, step, partial, aligned):
-    """A generator to iterate over the addresses in an address range."""
-    addr = start
-    end_full = end - step + 1
-    while addr < end_full:
+def _insn_create_700():
+    """Create an instruction for insn_decode in IDA 7."""
+    return idaapi.insn_t()
+
+def _insn_decode_700(insn, ea):
+    """A wrapper of idaapi.decode_insn for IDA 7."""
+    return idaapi.decode_insn(insn, ea)
+
+def _insn_create_695():
+    """Create an instruction for insn_decode in IDA 6.95.
+
+    IDA 6.95 always decodes into the global instruction idaapi.cmd.
+    """
+    return idaapi.cmd
+
+def _insn_decode_695(insn, ea):
+    """A wrapper of idaapi.decode_insn for IDA 6.95."""
+    return idaapi.decode_insn(ea)
+
+if idaapi.IDA_SDK_VERSION < 700:
+    insn_create = _insn_create_695
+    insn_decode = _insn_decode_695
+else:
+    insn_create = _insn_create_700
+    insn_decode = _insn_decode_700
+
+def _read_bytes_700(ea, size):
+    """A wrapper of idaapi.get_bytes for IDA 7."""
+    # Without GMB_READALL, get_bytes stops at the first byte without a value.
+    data = idaapi.get_bytes(ea, size, 0)
+    if data is None or len(data) != size:
+        return None
+    return data
+
+def _read_bytes_695(ea, size):
+    """A wrapper of idaapi.get_many_bytes for IDA 6.95."""
+    return idaapi.get_many_bytes(ea, size)
+
+# read_bytes(ea, size) returns the size bytes at ea, or None if any of those bytes has no value.
+if idaapi.IDA_SDK_VERSION < 700:
+    read_bytes = _read_bytes_695
+else:
+    read_bytes = _read_bytes_700
+
+def _addresses_tail(addr, end, partial, aligned):
+    """A generator for the address after the last full step of an unaligned address range."""
+    if aligned:
+        raise AlignmentError(end)
+    if addr < end and partial:
         yield addr
-        addr += step
-    if addr != end:
-        if aligned:
-            raise AlignmentError(end)
-        if addr < end and partial:
-            yield addr
 
-def _mapped_addresses(addresses, step, partial, allow_unmapped):
+def _addresses(start, end, step, partial, aligned):
+    """Create an iterator over the addresses in an address range."""
+    # Iterate over the full steps with itertools rather than a generator so that the loop runs in
+    # C. xrange() can't be used since it doesn't support addresses larger than a C long.
+    full = max((end - start) // step, 0)
+    addresses = islice(count(start, step), full)
+    addr = start + full * step
+    if addr == end:
+        return addresses
+    # Any alignment error or partial address is only generated once the full steps are exhausted.
+    return chain(addresses, _addresses_tail(addr, end, partial, aligned))
+
+def _mapped_addresses(addresses, step, partial, allow_unmapped, _isLoaded=_isLoaded):
     """Wrap an _addresses generator with a filter that checks whether the addresses are mapped."""
     for addr in addresses:
-        start_is_mapped = is_mapped(addr)
-        end_is_mapped   = is_mapped(addr + step - 1)
+        start_is_mapped = _isLoaded(addr)
+        # Only check the last byte if it's a different byte and the answer could matter: if the
+        # first byte is unmapped and we don't allow partial elements, the element is unmapped.
+        if step == 1:
+            end_is_mapped = start_is_mapped
+        elif start_is_mapped or partial:
+            end_is_mapped = _isLoaded(addr + step - 1)
+        else:
+            end_is_mapped = False
         fully_mapped    = start_is_mapped and end_is_mapped
         allowed_partial = partial and (start_is_mapped or end_is_mapped)
         # Yield the value if it's sufficiently mapped. Otherwise, break if we stop at an
@@ -218,6 +328,9 @@ def Addresses(start, end=None, step=1, length=None, partial=False, aligned=False
             True, then a partially mapped address will be returned and then iteration will stop.
     """
     # HACK: We only check the first and last byte, not all the bytes in between.
+    # Fast path for the common case of an explicit end address with no mapping checks.
+    if unmapped and length is None and end is not None and step >= 1:
+        return _addresses(start, end, step, partial, aligned)
     # Validate step.
     if step < 1:
         raise ValueError('Invalid arguments: step={}'.format(step))
@@ -238,11 +351,21 @@ def Addresses(start, end=None, step=1, length=None, partial=False, aligned=False
     else:
         return _mapped_addresses(addresses, step, partial, allow_unmapped)
 
-def _instructions_by_range(start, end):
+def _decode_instructions_reused():
+    """Create a decoder that decodes every instruction into the same insn_t buffer."""
+    insn = insn_create()
+    def decode(pc):
+        if not insn_decode(insn, pc):
+            return None
+        return insn
+    return decode
+
+def _instructions_by_range(start, end, reuse, _DecodeInstruction=_DecodeInstruction):
     """A generator to iterate over instructions in a range."""
+    decode = _decode_instructions_reused() if reuse else _DecodeInstruction
     pc = start
     while pc < end:
-        insn = idautils.DecodeInstruction(pc)
+        insn = decode(pc)
         if insn is None:
             break
         next_pc = pc + insn.size
@@ -251,16 +374,17 @@ def _instructions_by_range(start, end):
         yield insn
         pc = next_pc
 
-def _instructions_by_count(pc, count):
+def _instructions_by_count(pc, count, reuse, _DecodeInstruction=_DecodeInstruction):
     """A generator to iterate over a specified number of instructions."""
+    decode = _decode_instructions_reused() if reuse else _DecodeInstruction
     for i in xrange(count):
-        insn = idautils.DecodeInstruction(pc)
+        insn = decode(pc)
         if insn is None:
             break
         yield insn
         pc += insn.size
 
-def Instructions(start, end=None, count=None):
+def Instructions(start, end=None, count=None, reuse=False):
     """A generator to iterate over instructions.
 
     Instructions are decoded using IDA's DecodeInstruction(). If an address range is specified and
@@ -273,6 +397,9 @@ def Instructions(start, end=None, count=None):
     Options:
         end: The linear address at which to stop, exclusive.
         count: The number of instructions to decode.
+        reuse: If true, decode every instruction into a single instruction object using
+            insn_decode() rather than allocating a new one each iteration. The instruction is owned
+            by the generator and its contents will change between iterations. Default is False.
 
     Notes:
         Exactly one of end and count must be specified.
@@ -280,9 +407,9 @@ def Instructions(start, end=None, count=None):
     if (end is not None and count is not None) or (end is None and count is None):
         raise ValueError('Invalid arguments: end={}, count={}'.format(end, count))
     if end is not None:
-        return _instructions_by_range(start, end)
+        return _instructions_by_range(start, end, reuse)
     else:
-        return _instructions_by_count(start, count)
+        return _instructions_by_count(start, count, reuse)
 
 _FF_FLAG_FOR_SIZE = {
     1:  idc.FF_BYTE,
@@ -296,23 +423,53 @@ def word_flag(wordsize=WORD_SIZE):
     """Get the FF_xxxx flag for the given word size."""
     return _FF_FLAG_FOR_SIZE.get(wordsize, 0)
 
+_WORD_STRUCT_FORMAT = { 1: 'B', 2: 'H', 4: 'I', 8: 'Q' }
+
+_word_structs = {}
+"""A cache of the struct.Struct for a single word of each size, in the platform's byte order."""
+
+def _word_struct(wordsize):
+    """Get a struct.Struct to unpack a single word of the given size."""
+    word_struct = _word_structs.get(wordsize)
+    if word_struct is None:
+        byte_order = '>' if BIG_ENDIAN else '<'
+        word_struct = struct.Struct(byte_order + _WORD_STRUCT_FORMAT[wordsize])
+        _word_structs[wordsize] = word_struct
+    return word_struct
+
+_read_word_functions = {}
+"""A cache of the functions created by make_read_word, keyed by word size."""
+
+def make_read_word(wordsize=WORD_SIZE):
+    """Create a function to read words of the given size.
+
+    The returned function takes an address and behaves like read_word(ea, wordsize), but the word
+    format is looked up once rather than on every call. The function for each word size is only
+    created once.
+    """
+    read = _read_word_functions.get(wordsize)
+    if read is not None:
+        return read
+    if wordsize not in _WORD_STRUCT_FORMAT:
+        raise ValueError('Invalid argument: wordsize={}'.format(wordsize))
+    def read(ea, _read_bytes=read_bytes, _unpack=_word_struct(wordsize).unpack,
+            _wordsize=wordsize):
+        data = _read_bytes(ea, _wordsize)
+        return _unpack(data)[0] if data is not None else None
+    _read_word_functions[wordsize] = read
+    return read
+
 def read_word(ea, wordsize=WORD_SIZE):
     """Get the word at the given address.
 
-    Words are read using Byte(), Word(), Dword(), or Qword(), as appropriate. Addresses are checked
-    using is_mapped(). If the address isn't mapped, then None is returned.
+    Words are read using read_bytes() and unpacked in the platform's byte order. If any byte of the
+    word doesn't have a value, then None is returned.
     """
-    if not is_mapped(ea, wordsize):
-        return None
-    if wordsize == 1:
-        return idc.Byte(ea)
-    if wordsize == 2:
-        return idc.Word(ea)
-    if wordsize == 4:
-        return idc.Dword(ea)
-    if wordsize == 8:
-        return idc.Qword(ea)
-    raise ValueError('Invalid argument: wordsize={}'.format(wordsize))
+    if wordsize not in _WORD_STRUCT_FORMAT:
+        if not is_mapped(ea, wordsize):
+            return None
+        raise ValueError('Invalid argument: wordsize={}'.format(wordsize))
+    return make_read_word(wordsize)(ea)
 
 def patch_word(ea, value, wordsize=WORD_SIZE):
     """Patch the word at the given address.
@@ -440,32 +597,33 @@ def null_terminated(string):
     """Extract the NULL-terminated C string from the given array of bytes."""
     return string.split('\0', 1)[0]
 
-def _convert_address_to_function(func):
-    """Convert an address that IDA has classified incorrectly into a proper function."""
-    # If everything goes wrong, we'll try to restore this function.
-    orig = idc.FirstFuncFchunk(func)
-    # If the address is not code, let's undefine whatever it is.
-    if not idc.isCode(idc.GetFlags(func)):
-        if not is_mapped(func):
-            # Well, that's awkward.
-            return False
-        item    = idc.ItemHead(func)
-        itemend = idc.ItemEnd(func)
-        if item != idc.BADADDR:
-            _log(1, 'Undefining item {:#x} - {:#x}', item, itemend)
-            idc.MakeUnkn(item, idc.DOUNK_EXPAND)
-            idc.MakeCode(func)
-            # Give IDA a chance to analyze the new code or else we won't be able to create a
-            # function.
-            idc.Wait()
-            idc.AnalyseArea(item, itemend)
-    else:
-        # Just try removing the chunk from its current function. IDA can add it to another function
-        # automatically, so make sure it's removed from all functions by doing it in loop until it
-        # fails.
-        for i in range(1024):
-            if not idc.RemoveFchunk(func, func):
-                break
+def _make_code_for_function(func):
+    """Undefine the item at an address and convert it into code.
+
+    Returns the (start, end) bounds of the item that was undefined, or None.
+    """
+    item    = idc.ItemHead(func)
+    itemend = idc.ItemEnd(func)
+    if item == idc.BADADDR:
+        return None
+    _log(1, 'Undefining item {:#x} - {:#x}', item, itemend)
+    idc.MakeUnkn(item, idc.DOUNK_EXPAND)
+    idc.MakeCode(func)
+    return item, itemend
+
+def _remove_function_chunk(func):
+    """Remove the chunk at an address from every function that contains it."""
+    # IDA can add the chunk to another function automatically, so make sure it's removed from all
+    # functions by doing it in loop until it fails.
+    for i in range(1024):
+        if not idc.RemoveFchunk(func, func):
+            break
+
+def _make_function(func, orig):
+    """Make a function at an address that has already been converted to code.
+
+    orig is the function chunk that contained the address before it was converted, or BADADDR.
+    """
     # Now try making a function.
     if idc.MakeFunction(func) != 0:
         return True
@@ -491,6 +649,26 @@ def _convert_address_to_function(func):
         idc.MakeFunction(orig)
     return False
 
+def _convert_address_to_function(func):
+    """Convert an address that IDA has classified incorrectly into a proper function."""
+    # If everything goes wrong, we'll try to restore this function.
+    orig = idc.FirstFuncFchunk(func)
+    # If the address is not code, let's undefine whatever it is.
+    if not idc.isCode(idc.GetFlags(func)):
+        if not is_mapped(func):
+            # Well, that's awkward.
+            return False
+        bounds = _make_code_for_function(func)
+        if bounds is not None:
+            # Give IDA a chance to analyze the new code or else we won't be able to create a
+            # function.
+            idc.Wait()
+            idc.AnalyseArea(*bounds)
+    else:
+        # Just try removing the chunk from its current function.
+        _remove_function_chunk(func)
+    return _make_function(func, orig)
+
 def is_function_start(ea):
     """Return True if the address is the start of a function."""
     return idc.GetFunctionAttr(ea, idc.FUNCATTR_START) == ea
@@ -501,11 +679,87 @@ def force_function(addr):
         return True
     return _convert_address_to_function(addr)
 
+def force_functions(addrs):
+    """Ensure that the given addresses are function types, converting them if necessary.
+
+    This is equivalent to calling force_function() on each address, except that all the addresses
+    that need to be converted into code are converted first, so that we only wait for IDA's
+    autoanalysis once rather than once per address.
+
+    Returns the set of addresses that are functions.
+    """
+    functions = set()
+    # First, record the original function of each address that isn't already a function and
+    # convert all the addresses that aren't code into code. Each pending entry is a tuple
+    # (addr, orig, was_code, bounds), in the order the addresses were given.
+    pending = []
+    seen    = set()
+    for addr in addrs:
+        if addr in seen:
+            continue
+        seen.add(addr)
+        if is_function_start(addr):
+            functions.add(addr)
+            continue
+        orig = idc.FirstFuncFchunk(addr)
+        if idc.isCode(idc.GetFlags(addr)):
+            pending.append((addr, orig, True, None))
+        elif is_mapped(addr):
+            pending.append((addr, orig, False, _make_code_for_function(addr)))
+    # Give IDA a chance to analyze all the new code at once.
+    if any(bounds is not None for _, _, _, bounds in pending):
+        idc.Wait()
+    # Now try making each address a function, just like _convert_address_to_function.
+    for addr, orig, was_code, bounds in pending:
+        if was_code:
+            _remove_function_chunk(addr)
+        elif bounds is not None:
+            idc.AnalyseArea(*bounds)
+        if _make_function(addr, orig):
+            functions.add(addr)
+    return functions
+
+_READ_WORDS_MIN_CHUNK = 0x10
+_READ_WORDS_MAX_CHUNK = 0x1000
+
+def _read_words(start, nwords, step, wordsize):
+    """A generator to read up to nwords words at start, start + step, and so on."""
+    # The byte order prefix makes struct swap the bytes in C for big-endian platforms.
+    word_struct = _word_struct(wordsize)
+    fmt = word_struct.format
+    unpack_from = word_struct.unpack_from
+    read = make_read_word(wordsize)
+    chunk = _READ_WORDS_MIN_CHUNK
+    addr = start
+    while nwords > 0:
+        # Callers often stop after only a few words, so start with a small chunk and grow it.
+        n = min(nwords, chunk)
+        chunk = min(2 * chunk, _READ_WORDS_MAX_CHUNK)
+        data = read_bytes(addr, (n - 1) * step + wordsize)
+        if data is not None:
+            if step == wordsize:
+                words = struct.unpack('{}{}{}'.format(fmt[0], n, fmt[1]), data)
+            else:
+                words = [unpack_from(data, offset)[0] for offset in xrange(0, n * step, step)]
+            for word in words:
+                yield word
+        else:
+            # Some byte in the chunk isn't mapped. Fall back to reading each word individually so
+            # that we stop at exactly the same place as read_word().
+            for word_ea in islice(count(addr, step), n):
+                word = read(word_ea)
+                if word is None:
+                    return
+                yield word
+        addr   += n * step
+        nwords -= n
+
 def ReadWords(start, end, step=WORD_SIZE, wordsize=WORD_SIZE, addresses=False):
-    """A generator to iterate over the data words in the given address range.
+    """An iterator over the data words in the given address range.
 
     The iterator returns a stream of words or tuples for each mapped word in the address range.
-    Words are read using read_word(). Iteration stops at the first unmapped word.
+    Words are read in chunks using read_bytes(); a chunk that is not entirely mapped is instead
+    read word by word using read_word(). Iteration stops at the first unmapped word.
 
     Arguments:
         start: The start address.
@@ -518,12 +772,19 @@ def ReadWords(start, end, step=WORD_SIZE, wordsize=WORD_SIZE, addresses=False):
             mapped word in the address range. Otherwise, just the word itself will be returned.
             Default is False.
     """
-    for addr in Addresses(start, end, step=step, unmapped=True):
-        word = read_word(addr, wordsize)
-        if word is None:
-            break
-        value = (word, addr) if addresses else word
-        yield value
+    if step < 1:
+        raise ValueError('Invalid arguments: step={}'.format(step))
+    if wordsize not in _WORD_STRUCT_FORMAT:
+        raise ValueError('Invalid argument: wordsize={}'.format(wordsize))
+    # The same addresses as Addresses(start, end, step=step): each one is followed by at least step
+    # bytes before end.
+    nwords = (end - start - step) // step + 1 if end - start >= step else 0
+    words = _read_words(start, nwords, step, wordsize)
+    # Pair each word with its address using izip so that the tuples are built in C. izip stops as
+    # soon as the words run out.
+    if addresses:
+        return izip(words, count(start, step))
+    return words
 
 def WindowWords(start, end, window_size, wordsize=WORD_SIZE):
     """A generator to iterate over a sliding window of data words in the given address range.
@@ -533,7 +794,9 @@ def WindowWords(start, end, window_size, wordsize=WORD_SIZE):
     and its contents will change between iterations.
     """
     words = ReadWords(start, end, wordsize=wordsize)
-    window = deque([next(words) for _ in range(window_size)], maxlen=window_size)
+    window = deque(islice(words, window_size), maxlen=window_size)
+    if len(window) < window_size:
+        return
     addr = start
     yield window, addr
     for word in words:
@@ -541,6 +804,41 @@ def WindowWords(start, end, window_size, wordsize=WORD_SIZE):
         addr += wordsize
         yield window, addr
 
+class _WordWindows(object):
+    """A read-only sequence of the sliding windows of window_size words in a tuple of words."""
+
+    def __init__(self, words, window_size):
+        self._words       = words
+        self._window_size = window_size
+
+    def __len__(self):
+        return max(len(self._words) - self._window_size + 1, 0)
+
+    def __getitem__(self, index):
+        """Get the window at the given index as a tuple of words.
+
+        Only integer indices are supported; slices raise a TypeError.
+        """
+        if not isinstance(index, (int, long)):
+            raise TypeError('Window indices must be integers, not {}'.format(type(index).__name__))
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError(index)
+        return self._words[index:index + self._window_size]
+
+def WindowWordsArray(start, end, window_size, wordsize=WORD_SIZE):
+    """Read the data words in the given address range and return all their sliding windows.
+
+    Returns a tuple (windows, ea), where windows is a sequence whose ith element is a tuple of the
+    window_size words at address ea + i * wordsize. Unlike WindowWords, the words are read all at
+    once using ReadWords() and each window is independent of the others, so this is best suited to
+    callers that will look at most of the windows.
+    """
+    words = tuple(ReadWords(start, end, step=wordsize, wordsize=wordsize))
+    return _WordWindows(words, window_size), start
+
 def struct_create(name, union=False):
     """Create an IDA struct with the given name, returning the SID."""
     # AddStrucEx is documented as returning -1 on failure, but in practice it seems to return
@@ -26,6 +26,8 @@ def initialize_data_offsets():
     # chance that a valid userspace address would happen to show up in regular program data that is
     # not actually an address. However, since kernel addresses are numerically much larger, the
     # chance of this happening is much less.
+    # Offset targets are checked against the cached segment bounds, so make sure they are current.
+    idau.invalidate_segment_cache()
     for seg in idautils.Segments():
         name = idc.SegName(seg)
         if not (name.endswith('__DATA_CONST.__const') or name.endswith('__got')
@@ -5,10 +5,10 @@
 # Functions for analyzing stub functions in the kernelcache.
 #
 
-import re
+import bisect
+import struct
 
 import idc
-import idautils
 import idaapi
 
 import ida_utilities as idau
@@ -19,30 +19,114 @@ _log = idau.make_log(1, __name__)
 kernelcache_stub_suffix = '___stub_'
 """The suffix that gets appended to a symbol to create the stub name, without the stub ID."""
 
-_stub_regex = re.compile(r"^(\S+)" + kernelcache_stub_suffix + r"\d+$")
-"""A regular expression to match and extract the target name from a stub symbol."""
+_ARM64_INSN_SIZE = 4
+
+# Fixed opcode bits of the instructions in _process_stub_template_1.
+_ADRP_MASK, _ADRP_VAL = 0x9F000000, 0x90000000  # ADRP Xd, #imm
+_LDR_MASK,  _LDR_VAL  = 0xFFC00000, 0xF9400000  # LDR Xt, [Xn, #imm] (64-bit, unsigned offset)
+_BR_MASK,   _BR_VAL   = 0xFFFFFC1F, 0xD61F0000  # BR Xn
 
 def stub_name_target(stub_name):
     """Get the target to which a stub name refers.
 
     No checks are performed to ensure that the target actually exists.
     """
-    match = _stub_regex.match(stub_name)
-    if not match:
+    # A stub name is the target name followed by the stub suffix and a decimal stub ID. This is
+    # called on every referenced address in the __stubs sections, so avoid the regex machinery.
+    index = stub_name.rfind(kernelcache_stub_suffix)
+    if index <= 0:
+        return None
+    if not stub_name[index + len(kernelcache_stub_suffix):].isdigit():
         return None
-    return match.group(1)
+    return stub_name[:index]
 
 def symbol_references_stub(symbol_name):
     """Check if the symbol name references a stub."""
     return kernelcache_stub_suffix in symbol_name
 
-def _process_stub_template_1(stub):
-    """A template to match the following stub pattern:
+def _segments_with_names():
+    """A generator over each segment in the database and its name, as tuples (seg, segname).
 
-    ADRP X<reg>, #<offset>@PAGE
-    LDR  X<reg>, [X<reg>, #<offset>@PAGEOFF]
-    BR   X<reg>
+    This walks IDA's segment table directly rather than going through idautils.Segments() and
+    idc.SegName(), which look each segment up again by address.
+    """
+    for n in xrange(idaapi.get_segm_qty()):
+        seg = idaapi.getnseg(n)
+        yield seg, idaapi.get_true_segm_name(seg)
+
+_GOT_WORD_FORMAT = ('>' if idau.BIG_ENDIAN else '<') + ('Q' if idau.WORD_SIZE == 8 else 'I')
+"""The struct format of a word in a __got section."""
+
+_got_cache = []
+"""A sorted list of (start, end, data) tuples caching the contents of the __got sections."""
+
+_got_cache_starts = []
+"""The start addresses of the sections in _got_cache, for bisection."""
+
+def _got_cache_build():
+    """Read the contents of each __got section into _got_cache."""
+    global _got_cache, _got_cache_starts
+    cache = []
+    for seg, segname in _segments_with_names():
+        if not segname or not segname.endswith(('__got', '__auth_got')):
+            continue
+        data = idau.read_bytes(seg.startEA, seg.endEA - seg.startEA)
+        if data:
+            cache.append((seg.startEA, seg.endEA, data))
+    cache.sort()
+    _got_cache = cache
+    _got_cache_starts = [start for start, _, _ in cache]
+
+def _got_cache_clear():
+    """Release the contents of _got_cache."""
+    global _got_cache, _got_cache_starts
+    _got_cache = []
+    _got_cache_starts = []
+
+def _read_got_word(ea):
+    """Read a word, using _got_cache if the word is in a cached __got section.
+
+    Stubs load their targets from the __got sections, so this turns a lookup through IDA into a
+    slice of a string we read once.
+    """
+    index = bisect.bisect_right(_got_cache_starts, ea) - 1
+    if index >= 0:
+        start, end, data = _got_cache[index]
+        if ea + idau.WORD_SIZE <= end:
+            return struct.unpack_from(_GOT_WORD_FORMAT, data, ea - start)[0]
+    return idau.read_word(ea)
+
+def _stub_template_1_offset_raw(stub):
+    """Get the address loaded by a _process_stub_template_1 stub by decoding the raw instructions.
+
+    Returns None if the instructions do not match the template.
     """
+    data = idau.read_bytes(stub, 3 * _ARM64_INSN_SIZE)
+    if not data:
+        return None
+    adrp, ldr, br = struct.unpack('<III', data)
+    if ((adrp & _ADRP_MASK) != _ADRP_VAL
+            or (ldr & _LDR_MASK) != _LDR_VAL
+            or (br & _BR_MASK) != _BR_VAL):
+        return None
+    # All the registers must be the same. Register 31 is XZR in ADRP but SP in LDR, so exclude it.
+    reg = adrp & 0x1f
+    if (reg == 31
+            or ldr & 0x1f != reg
+            or (ldr >> 5) & 0x1f != reg
+            or (br >> 5) & 0x1f != reg):
+        return None
+    # ADRP: The page offset is the signed 21-bit immhi:immlo, in units of 4K pages.
+    imm = ((adrp >> 3) & 0x1ffffc) | ((adrp >> 29) & 0x3)
+    if imm & 0x100000:
+        imm -= 0x200000
+    page = ((stub & ~0xfff) + (imm << 12)) & 0xffffffffffffffff
+    # LDR: The offset is the unsigned 12-bit imm12, scaled by the access size.
+    pageoff = ((ldr >> 10) & 0xfff) << 3
+    return page + pageoff
+
+def _stub_template_1_offset(stub):
+    """Get the address loaded by a _process_stub_template_1 stub using IDA's disassembler."""
     adrp, ldr, br = idau.Instructions(stub, count=3)
     if (adrp.itype == idaapi.ARM_adrp and adrp.Op1.type == idaapi.o_reg
             and adrp.Op2.type == idaapi.o_imm
@@ -50,8 +134,22 @@ def _process_stub_template_1(stub):
             and ldr.Op2.type == idaapi.o_displ and ldr.auxpref == 0
             and br.itype == idaapi.ARM_br and br.Op1.type == idaapi.o_reg
             and adrp.Op1.reg == ldr.Op1.reg == ldr.Op2.reg == br.Op1.reg):
-        offset = adrp.Op2.value + ldr.Op2.addr
-        target = idau.read_word(offset)
+        return adrp.Op2.value + ldr.Op2.addr
+
+def _process_stub_template_1(stub):
+    """A template to match the following stub pattern:
+
+    ADRP X<reg>, #<offset>@PAGE
+    LDR  X<reg>, [X<reg>, #<offset>@PAGEOFF]
+    BR   X<reg>
+    """
+    # The instructions have fixed encodings, so we can usually match them without decoding them
+    # through IDA.
+    offset = _stub_template_1_offset_raw(stub)
+    if offset is None:
+        offset = _stub_template_1_offset(stub)
+    if offset is not None:
+        target = _read_got_word(offset)
         if target and idau.is_mapped(target):
             return target
 
@@ -100,16 +198,14 @@ def _symbolicate_stub(stub, target, next_stub):
         return False
     return True
 
-def _process_possible_stub(stub, make_thunk, next_stub):
-    """Try to process a stub function."""
-    # First, make sure this is a stub format we recognize.
-    target = stub_target(stub)
-    if not target:
-        _log(0, 'Unrecognized stub format at {:#x}', stub)
-        return False
-    # Next, check if IDA sees this as a function chunk rather than a function, and correct it if
-    # reasonable.
-    if not idau.force_function(stub):
+def _apply_stub(stub, target, make_thunk, next_stub, functions):
+    """Convert a stub found by _discover_stubs into a symbolicated function.
+
+    The stub and its target must already have been passed to idau.force_functions(), and functions
+    is the set of addresses it returned.
+    """
+    # First, check that IDA sees this as a function rather than a function chunk.
+    if stub not in functions:
         _log(1, 'Could not convert stub to function at {:#x}', stub)
         return False
     # Next, set the appropriate flags on the stub. Make the stub a thunk if that was requested.
@@ -125,22 +221,32 @@ def _process_possible_stub(stub, make_thunk, next_stub):
     if idc.SetFunctionFlags(stub, flags | idc.FUNC_THUNK) == 0:
         _log(1, 'Could not set function flags for stub at {:#x}', stub)
         return False
-    # Next, ensure that IDA sees the target as a function, but continue anyway if that fails.
-    if not idau.force_function(target):
+    # Next, check that IDA sees the target as a function, but continue anyway if it doesn't.
+    if target not in functions:
         _log(1, 'Stub {:#x} has target {:#x} that is not a function', stub, target)
     # Finally symbolicate the stub.
     if not _symbolicate_stub(stub, target, next_stub):
         return False
     return True
 
-def _process_stubs_section(segstart, make_thunk, next_stub):
-    """Process all the functions in a __stubs section."""
-    segend = idc.SegEnd(segstart)
+def _discover_stubs(segstart, segend):
+    """Find the stubs in a __stubs section.
+
+    This only reads from the database. Returns a list of (stub, target) tuples.
+    """
+    stubs = []
     # We'll go through each address and check if it has a reference. If it does, it is likely a
-    # stub. As long as the address doesn't already have a stub name, process it.
-    for ea in idau.Addresses(segstart, segend, step=1):
+    # stub. As long as the address doesn't already have a stub name, process it. Arm64 instructions
+    # are always 4-byte aligned, so we only need to check every fourth byte.
+    for ea in idau.Addresses(segstart, segend, step=_ARM64_INSN_SIZE):
         if idc.isRef(idc.GetFlags(ea)) and not stub_name_target(idau.get_ea_name(ea)):
-            _process_possible_stub(ea, make_thunk, next_stub)
+            # Make sure this is a stub format we recognize.
+            target = stub_target(ea)
+            if not target:
+                _log(0, 'Unrecognized stub format at {:#x}', ea)
+                continue
+            stubs.append((ea, target))
+    return stubs
 
 def initialize_stub_symbols(make_thunk=True):
     """Populate IDA with information about the stubs in an iOS kernelcache.
@@ -154,10 +260,20 @@ def initialize_stub_symbols(make_thunk=True):
         make_thunk: Set the thunk attribute for each stub function. Default is True.
     """
     next_stub = internal.make_name_generator(kernelcache_stub_suffix)
-    for ea in idautils.Segments():
-        segname = idc.SegName(ea)
-        if not segname.endswith('__stubs'):
-            continue
-        _log(3, 'Processing segment {}', segname)
-        _process_stubs_section(ea, make_thunk, next_stub)
-
+    # First find all the stubs and their targets, which only reads from the database. The stub
+    # targets are all read out of the __got sections, so we read those in bulk up front.
+    stubs = []
+    _got_cache_build()
+    try:
+        for seg, segname in _segments_with_names():
+            if not segname or not segname.endswith('__stubs'):
+                continue
+            _log(3, 'Processing segment {}', segname)
+            stubs.extend(_discover_stubs(seg.startEA, seg.endEA))
+    finally:
+        _got_cache_clear()
+    # Then make all the changes to the database. Converting the stubs and their targets into
+    # functions in one batch means we only wait for IDA's autoanalysis once.
+    functions = idau.force_functions([stub for stub, _ in stubs] + [target for _, target in stubs])
+    for stub, target in stubs:
+        _apply_stub(stub, target, make_thunk, next_stub, functions)
@@ -75,6 +75,9 @@ def untag_pointers_in_range(start, end):
 
 def untag_pointers():
     _log(2, 'Starting tagged pointer conversion')
+    # is_tagged_pointer() checks targets against the cached segment bounds, so make sure they are
+    # current.
+    idau.invalidate_segment_cache()
     for seg in idautils.Segments():
         untag_pointers_in_range(idc.SegStart(seg), idc.SegEnd(seg))
     _log(2, 'Tagged pointer conversion complete')